@@ -0,0 +1,82 @@
+import time
+
+import numpy as np
+import streamlit as st
+from sklearn.cluster import MiniBatchKMeans
+
+EMBED_MODEL = "e5-base-v2"
+EMBED_DIM = 768
+SIMILARITY_THRESHOLD = 0.83
+MAX_ENTRIES = 1000
+TTL_SECONDS = 7 * 24 * 3600
+CLUSTER_AFTER = 256
+NUM_CENTROIDS = 128
+
+
+def normalize(question):
+    return " ".join(question.split()).lower()
+
+
+def _init_cache():
+    if "sem_cache_vecs" not in st.session_state:
+        st.session_state.sem_cache_vecs = np.empty((0, EMBED_DIM), dtype=np.float32)
+        st.session_state.sem_cache_answers = []
+        st.session_state.sem_cache_times = []
+
+
+def embed_question(session, question):
+    row = session.sql(
+        "SELECT SNOWFLAKE.CORTEX.EMBED_TEXT_768(?, ?)", [EMBED_MODEL, question]
+    ).collect()[0]
+    vec = np.asarray(row[0], dtype=np.float32)
+    norm = np.linalg.norm(vec)
+    return vec / norm if norm else vec
+
+
+def _evict_stale():
+    now = time.time()
+    times = st.session_state.sem_cache_times
+    keep = [i for i, t in enumerate(times) if now - t < TTL_SECONDS]
+    if len(keep) > MAX_ENTRIES:
+        keep = keep[-MAX_ENTRIES:]
+    if len(keep) != len(times):
+        st.session_state.sem_cache_vecs = st.session_state.sem_cache_vecs[keep]
+        st.session_state.sem_cache_answers = [st.session_state.sem_cache_answers[i] for i in keep]
+        st.session_state.sem_cache_times = [times[i] for i in keep]
+
+
+def _compact():
+    vecs = st.session_state.sem_cache_vecs
+    if len(vecs) <= CLUSTER_AFTER:
+        return
+    kmeans = MiniBatchKMeans(n_clusters=NUM_CENTROIDS, n_init="auto").fit(vecs)
+    centroids = kmeans.cluster_centers_.astype(np.float32)
+    norms = np.linalg.norm(centroids, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    centroids /= norms
+    # Keep the answer of the entry closest to each centroid.
+    nearest = np.argmax(vecs @ centroids.T, axis=0)
+    st.session_state.sem_cache_vecs = centroids
+    st.session_state.sem_cache_answers = [st.session_state.sem_cache_answers[i] for i in nearest]
+    st.session_state.sem_cache_times = [st.session_state.sem_cache_times[i] for i in nearest]
+
+
+def lookup(q_vec):
+    _init_cache()
+    _evict_stale()
+    vecs = st.session_state.sem_cache_vecs
+    if len(vecs) == 0:
+        return None
+    sims = vecs @ q_vec
+    best = int(np.argmax(sims))
+    if sims[best] >= SIMILARITY_THRESHOLD:
+        return st.session_state.sem_cache_answers[best]
+    return None
+
+
+def store(q_vec, answer):
+    _init_cache()
+    st.session_state.sem_cache_vecs = np.vstack([st.session_state.sem_cache_vecs, q_vec])
+    st.session_state.sem_cache_answers.append(answer)
+    st.session_state.sem_cache_times.append(time.time())
+    _compact()
@@ -1,385 +1,634 @@
-import streamlit as st
-from snowflake.core import Root
-from snowflake.cortex import Complete
-from snowflake.snowpark.session import Session
-import snowflake.connector
-import json
-import os
-import shutil
-import tempfile
-import fitz
-
-APP_NAME = "SS IntelliBot"
-st.set_page_config(APP_NAME, page_icon="🤖", layout="wide")
-MODELS = ["mistral-large2", "llama3.1-70b", "llama3.1-8b"]
-
-# Snowflake session config
-connection_parameters = {
-    "user": st.secrets["snowflake"]["user"],
-    "password": st.secrets["snowflake"]["password"],
-    "account": st.secrets["snowflake"]["account"],
-    "warehouse": st.secrets["snowflake"]["warehouse"],
-    "database": st.secrets["snowflake"]["database"],
-    "schema": st.secrets["snowflake"]["schema"],
-    "role": st.secrets["snowflake"].get("role", "ACCOUNTADMIN")
-}
-
-session = Session.builder.configs(connection_parameters).create()
-root = Root(session)
-
-TOPICS = ["All Topics", "Database Concepts", "AWS Framework", "Python for Beginners", "Azure", "PostgreSQL", "Kubernetes", "Pro Git", "OWASP"]
-SESSION_STATE_FILE = "session_state.json"
-STAGE_NAME = "@cortex_search_tutorial_db.public.fomc"
-
-def complete(model, prompt):
-    return Complete(model, prompt, session=session).replace("$", "\$")
-
-
-def save_session_state():
-    with open(SESSION_STATE_FILE, "w") as f:
-        json.dump({
-            "messages": st.session_state.get("messages", []),
-            "pinned_messages": st.session_state.get("pinned_messages", [])
-        }, f)
-
-
-def load_session_state():
-    if os.path.exists(SESSION_STATE_FILE):
-        with open(SESSION_STATE_FILE, "r") as f:
-            state = json.load(f)
-            st.session_state["messages"] = state.get("messages", [])
-            st.session_state["pinned_messages"] = state.get("pinned_messages", [])
-
-
-def init_messages():
-    if "messages" not in st.session_state:
-        load_session_state()
-        st.session_state.setdefault("messages", [])
-        st.session_state.setdefault("pinned_messages", [])
-    if st.session_state.get("clear_conversation"):
-        st.session_state.messages = []
-        save_session_state()
-
-
-def init_service_metadata():
-    if "service_metadata" not in st.session_state:
-        services = session.sql("SHOW CORTEX SEARCH SERVICES;").collect()
-        metadata = []
-        for s in services:
-            svc_name = s["name"]
-            search_col = session.sql(f"DESC CORTEX SEARCH SERVICE {svc_name};").collect()[0]["search_column"]
-            metadata.append({"name": svc_name, "search_column": search_col})
-        st.session_state.service_metadata = metadata
-
-
-def get_chat_history():
-    return st.session_state.messages[-st.session_state.num_chat_messages:-1]
-
-
-def summarize_chat(chat_history, question):
-    prompt = f"""
-    [INST]
-    Extend the user question using the chat history.
-    <chat_history>{chat_history}</chat_history>
-    <question>{question}</question>
-    [/INST]
-    """
-    return complete(st.session_state.model_name, prompt)
-
-
-def build_prompt(question):
-    chat_history = get_chat_history() if st.session_state.use_chat_history else []
-    chat_text = "\n".join([msg["content"] for msg in chat_history if msg["role"] == "user"])
-    summary = summarize_chat(chat_text, question) if chat_history else question
-    context = query_cortex(summary)
-    prompt = f"""
-    [INST]
-    You are SS IntelliBot, a helpful AI assistant with access to PDF-based knowledge.
-    Use the provided <context> and <chat_history> to answer user questions.
-    Respond clearly, briefly, and helpfully.
-
-    <chat_history>{chat_text}</chat_history>
-    <context>{context}</context>
-    <question>{question}</question>
-    [/INST]
-    Answer:
-    """
-    return prompt
-
-
-def query_cortex(query, columns=None, filter={}):
-    columns = columns or []
-    db, schema = session.get_current_database(), session.get_current_schema()
-    svc = root.databases[db].schemas[schema].cortex_search_services[st.session_state.selected_cortex_search_service]
-    search_col = next(s["search_column"] for s in st.session_state.service_metadata if s["name"] == st.session_state.selected_cortex_search_service)
-    all_columns = list(set(columns + [search_col, "file_url", "relative_path"]))
-    results = svc.search(query, columns=all_columns, filter=filter, limit=st.session_state.num_retrieved_chunks).results
-
-    def make_context(i, r):
-        file = r.get("relative_path", "unknown")
-        chunk = r.get(search_col.lower(), "[Missing chunk]")
-        return f"Context {i+1}: {file}:\n{chunk}"
-
-    context = "\n\n".join([make_context(i, r) for i, r in enumerate(results)])
-
-    if st.session_state.debug:
-        st.sidebar.text_area("📄 Context Documents", context, height=300)
-    return context
-
-
-def apply_theme():
-    if st.session_state.get("dark_mode"):
-        st.markdown("""
-            <style>
-            body, .stApp {
-                background-color: #0e1117;
-                color: #fafafa;
-            }
-            </style>
-        """, unsafe_allow_html=True)
-    else:
-        st.markdown("""
-            <style>
-            body, .stApp {
-                background-color: #f2f2f2;
-                color: #000000;
-            }
-            </style>
-        """, unsafe_allow_html=True)
-
-
-def init_config():
-    with st.sidebar:
-        st.toggle("🌓 Dark Mode", key="dark_mode", value=False)
-        apply_theme()
-        st.title("⚙️ Configuration")
-        st.selectbox("Cortex Search Service", [s["name"] for s in st.session_state.service_metadata], key="selected_cortex_search_service")
-        st.button("🧹 Clear Chat", key="clear_conversation")
-        st.toggle("🐞 Debug Mode", key="debug", value=False)
-        st.toggle("🕘 Use Chat History", key="use_chat_history", value=True)
-        st.selectbox("📂 Filter by Topic", TOPICS, key="selected_topic")
-        st.image("https://raw.githubusercontent.com/Shail1602/Inellibot/main/SS%20Intellibot.png", caption="SS IntelliBot", use_container_width=True)
-        st.caption("Ask Smart. Get Smarter.")
-        
-        with st.expander("🧠 Advanced Options"):
-            st.selectbox("Select Model", MODELS, key="model_name")
-            st.slider("Context Chunks", 1, 10, 5, key="num_retrieved_chunks")
-            st.slider("Chat History Messages", 1, 10, 5, key="num_chat_messages")
-
-def upload_to_snowflake_stage(uploaded_file):
-    with tempfile.NamedTemporaryFile(delete=False) as tmp:
-        tmp.write(uploaded_file.read())
-        tmp_path = tmp.name
-
-    conn = snowflake.connector.connect(**connection_parameters)
-    cs = conn.cursor()
-    file_name = os.path.basename(uploaded_file.name).replace(" ", "_")
-    staged_path = f"{file_name}" 
-    target_temp_path = os.path.join(tempfile.gettempdir(), file_name)
-    shutil.copy(tmp_path, target_temp_path)
-    staged_file_path = f"fomc/{file_name}"
-
-    extracted_text = []
-    try:
-        with fitz.open(tmp_path) as doc:
-            for page in doc:
-                text = page.get_text()
-                if text.strip():
-                    extracted_text.append(text.strip())
-    except Exception as e:
-        st.error(f"Failed to extract text: {e}")
-        return
-    
-    try:
-        put_query = f"PUT file://{target_temp_path} {STAGE_NAME}  OVERWRITE=TRUE AUTO_COMPRESS=FALSE"
-        cs.execute(put_query)
-        cs.execute("USE DATABASE cortex_search_tutorial_db")
-        cs.execute("USE SCHEMA public")
-        cs.execute(f"ALTER STAGE cortex_search_tutorial_db.public.fomc REFRESH")
-        
-        for idx, chunk in enumerate(extracted_text):
-            chunk_sql = f"""
-            INSERT INTO cortex_search_tutorial_db.public.docs_chunks_table
-            SELECT
-                relative_path,
-                build_scoped_file_url({STAGE_NAME}, relative_path) AS file_url,
-                CONCAT(SPLIT_PART(relative_path, '/', -1), ': ', func.chunk) AS chunk,
-                'English' AS language
-            FROM (
-                SELECT relative_path
-                FROM directory({STAGE_NAME})
-                WHERE relative_path = ('{file_name}') 
-            ),
-            TABLE(cortex_search_tutorial_db.public.pdf_text_chunker(build_scoped_file_url({STAGE_NAME}, relative_path))) AS func;
-            """
-            cs.execute(chunk_sql)
-            cs.execute("ALTER STAGE cortex_search_tutorial_db.public.fomc REFRESH")
-            cs.execute("""
-            CREATE OR REPLACE CORTEX SEARCH SERVICE cortex_search_tutorial_db.public.fomc_meeting
-                ON chunk
-                ATTRIBUTES language
-                WAREHOUSE = cortex_search_tutorial_wh
-                TARGET_LAG = '1 minute'
-                AS (
-                    SELECT
-                        chunk,
-                        relative_path,
-                        file_url,
-                        language
-                    FROM cortex_search_tutorial_db.public.docs_chunks_table
-                );
-            """)
-            st.success(f"✅ Uploaded and Reindexed the file : {file_name}")
-            
-            os.remove(tmp_path)
-            if os.path.exists(target_temp_path):
-                os.remove(target_temp_path)       
-            if "uploaded_pdf" in st.session_state:
-                del st.session_state["uploaded_pdf"]
-            
-    except Exception as e:
-        st.error(f"Failed to upload/index: {e}")
-    finally:
-        cs.close()
-        conn.close()
-
-def handle_uploaded_pdf():
-    uploaded_file = st.sidebar.file_uploader("📥 Upload PDF", type=["pdf"], key="pdf_uploader")
-    if uploaded_file is not None:
-        st.session_state.uploaded_pdf = uploaded_file.name
-        st.sidebar.success(f"Uploaded: {uploaded_file.name}")
-        upload_to_snowflake_stage(uploaded_file)
-
-
-def generate_summary():
-    full_history = st.session_state.messages
-    formatted_history = ""
-    for m in full_history:
-        role = "User" if m["role"] == "user" else "Assistant"
-        formatted_history += f"{role}: {m['content']}\n"
-    prompt = f"""
-    [INST]
-    You are an expert summarizer. Summarize the following chat conversation into 5-7 key bullet points that capture the main ideas and solutions shared by the assistant. Be concise, and do not repeat.
-    <chat_history>
-    {formatted_history}
-    </chat_history>
-    Your output should look like:
-    - Point 1
-    - Point 2
-    ...
-    [/INST]
-    """
-    summary = complete(st.session_state.model_name, prompt)
-    return summary.strip()
-
-
-def add_custom_css():
-    chat_left_bg = "#f4f4f4" if not st.session_state.get("dark_mode") else "#1e1e1e"
-    chat_right_bg = "#dcf4ea" if not st.session_state.get("dark_mode") else "#2e2e2e"
-    text_color = "#000000" if not st.session_state.get("dark_mode") else "#fafafa"
-    st.markdown(f"""
-        <style>
-        .chat-left {{
-            background-color: {chat_left_bg};
-            color: {text_color};
-            padding: 14px;
-            border-radius: 14px;
-            margin: 12px 0;
-            text-align: left;
-            font-size: 15px;
-            border-left: 4px solid #1f77b4;
-        }}
-        .chat-right {{
-            background-color: {chat_right_bg};
-            color: {text_color};
-            padding: 14px;
-            border-radius: 14px;
-            margin: 12px 0;
-            text-align: right;
-            font-size: 15px;
-            border-right: 4px solid #2a9d8f;
-        }}
-        </style>
-    """, unsafe_allow_html=True)
-
-
-def main():
-    st.markdown("""<div style='background: linear-gradient(to right, #f2f2f2, #e0f7fa); padding: 25px 40px; border-radius: 12px; box-shadow: 0 2px 8px rgba(0,0,0,0.1); margin-bottom: 20px; display: flex; align-items: center; justify-content: center; gap: 20px;'>
-    <div style='display: flex; align-items: center; gap: 20px;'>
-        <div style='background-color: #7b2cbf; color: white; font-size: 50px; font-weight: bold; width: 90px; height: 90px; border-radius: 50%; display: flex; align-items: center; justify-content: center; box-shadow: 0 0 12px rgba(123, 44, 191, 0.7); animation: pulseGlow 2s infinite;'>SS</div>
-        <div style='text-align: left;'>
-            <div style='font-size: 32px; font-weight: bold; color: #1f77b4;'>SS IntelliBot</div>
-            <div style='font-size: 16px; color: #333;'>Precision. Speed. Knowledge. — Your AI companion for data-driven excellence.</div>
-            <div style='font-size: 13px; color: #555; font-style: italic; margin-top: 8px;'>👨‍💻 Crafted with expertise by <strong>Shailesh Rahul</strong> & <strong>Saumya Shruti</strong></div>
-        </div>
-    </div>
-    <div>
-        <img src='https://raw.githubusercontent.com/Shail1602/Inellibot/main/dbr.jpg' alt='DB Logo' style='height: 100px; border-radius: 8px;'>
-        </div>
-        </div>
-    """, unsafe_allow_html=True)
-    st.markdown("<hr>", unsafe_allow_html=True)
-
-    add_custom_css()
-    init_service_metadata()
-    handle_uploaded_pdf()
-    init_config()
-    init_messages()
-
-    if len(st.session_state.messages) == 0:
-        st.markdown("""<div class='hero' style='margin-top: 10px;'>
-            👋 Welcome to SS IntelliBot! Ask any question based on our uploaded documents:
-            <br><br>
-            <b>Topics Available:</b> Database Concepts, AWS Framework, Python for Beginners,
-            Azure, PostgreSQL, Kubernetes, Pro Git, and OWASP.
-            <br><br>
-            Type your question below to get started!
-            <br><br>
-            <b>Try asking:</b>
-            <ul style='list-style-type: none; padding: 0;'>
-                <li>🔍 What is the difference between RDS and Redshift?</li>
-                <li>🤖 How do I deploy a model in Kubernetes?</li>
-                <li>🔐 What are OWASP Top 10 vulnerabilities?</li>
-                <li>🐘 How to connect Python to PostgreSQL?</li>
-                <li>☁️ What are key services in AWS Framework?</li>
-            </ul>
-        </div>""", unsafe_allow_html=True)
-
-    for i, msg in enumerate(st.session_state.messages):
-        css_class = "chat-left" if msg["role"] == "assistant" else "chat-right"
-        st.markdown(f"<div class='{css_class}'>{msg['content']}</div>", unsafe_allow_html=True)
-        if msg["role"] == "assistant":
-            if st.button("⭐ Pin this response", key=f"pin_{i}"):
-                st.session_state.pinned_messages.append(msg["content"])
-                save_session_state()
-                st.success("Pinned!")
-
-    disable_chat = not st.session_state.service_metadata
-    if question := st.chat_input("💬 Ask your question...", disabled=disable_chat):
-        st.session_state.messages.append({"role": "user", "content": question})
-        with st.spinner("SS IntelliBot is typing..."):
-            prompt = build_prompt(question.replace("'", ""))
-            reply = complete(st.session_state.model_name, prompt)
-            st.session_state.messages.append({"role": "assistant", "content": reply})
-            save_session_state()
-            st.markdown(f"<div class='chat-left'>{reply}</div>", unsafe_allow_html=True)
-
-    if st.session_state.messages:
-        with st.expander("📌 Pinned Messages"):
-            for i, msg in enumerate(st.session_state.pinned_messages):
-                st.markdown(f"**Pinned {i+1}:** {msg}")
-
-        with st.expander("📊 Generate Summary"):
-            if st.button("Generate Insight Summary"):
-                summary = generate_summary()
-                st.markdown(f"**🔎 Summary:**\n\n{summary}", unsafe_allow_html=True)
-
-        with st.expander("⬇️ Download Chat History"):
-            full_chat = "\n".join([f"{m['role'].capitalize()}: {m['content']}" for m in st.session_state.messages])
-            st.download_button("Download .txt", full_chat, file_name="chat_history.txt")
-
-        with st.expander("📢 Feedback"):
-            st.radio("How helpful was the response?", ["👍 Excellent", "👌 Good", "👎 Needs Improvement"])
-
-if __name__ == "__main__":
-    main()
+import streamlit as st
+import threading
+import time
+import zlib
+from concurrent.futures import Future, ThreadPoolExecutor
+import json
+import os
+import shutil
+import string
+import tempfile
+import xxhash
+
+APP_NAME = "SS IntelliBot"
+st.set_page_config(APP_NAME, page_icon="🤖", layout="wide")
+MODELS = ["mistral-large2", "llama3.1-70b", "llama3.1-8b"]
+
+# Snowflake session config
+def _connection_parameters():
+    return {
+        "user": st.secrets["snowflake"]["user"],
+        "password": st.secrets["snowflake"]["password"],
+        "account": st.secrets["snowflake"]["account"],
+        "warehouse": st.secrets["snowflake"]["warehouse"],
+        "database": st.secrets["snowflake"]["database"],
+        "schema": st.secrets["snowflake"]["schema"],
+        "role": st.secrets["snowflake"].get("role", "ACCOUNTADMIN")
+    }
+
+
+# The snowflake packages pull in hundreds of submodules, so they are imported
+# lazily inside the cached factories to keep first paint fast on cold starts.
+@st.cache_resource
+def get_session():
+    from snowflake.snowpark.session import Session
+    return Session.builder.configs(_connection_parameters()).create()
+
+
+@st.cache_resource
+def get_root():
+    from snowflake.core import Root
+    return Root(get_session())
+
+
+@st.cache_resource
+def get_executor():
+    return ThreadPoolExecutor(max_workers=4)
+
+
+@st.cache_resource
+def get_inflight_requests():
+    return {"lock": threading.Lock(), "futures": {}}
+
+
+@st.cache_resource
+def get_llm_semaphore():
+    return threading.BoundedSemaphore(MAX_CONCURRENT_COMPLETIONS)
+
+
+def prompt_key(model, prompt):
+    # xxh3 is several times faster than sha1 on short strings and plenty for
+    # cache dispatch; these keys are not security-sensitive.
+    return xxhash.xxh3_64_intdigest((model + prompt).encode())
+
+
+@st.cache_resource
+def get_exact_cache():
+    return {"lock": threading.Lock(), "entries": {}}
+
+
+def exact_cache_get(key):
+    cache = get_exact_cache()
+    with cache["lock"]:
+        entry = cache["entries"].get(key)
+        if entry is None:
+            return None
+        blob, stored_at = entry
+        if time.time() - stored_at > EXACT_CACHE_TTL:
+            del cache["entries"][key]
+            return None
+        return zlib.decompress(blob).decode()
+
+
+def exact_cache_put(key, answer):
+    cache = get_exact_cache()
+    with cache["lock"]:
+        entries = cache["entries"]
+        entries[key] = (zlib.compress(answer.encode()), time.time())
+        while len(entries) > EXACT_CACHE_MAX_ENTRIES:
+            entries.pop(next(iter(entries)))
+
+TOPICS = ["All Topics", "Database Concepts", "AWS Framework", "Python for Beginners", "Azure", "PostgreSQL", "Kubernetes", "Pro Git", "OWASP"]
+EXAMPLE_QUERIES = [
+    "What is the difference between RDS and Redshift?",
+    "How do I deploy a model in Kubernetes?",
+    "What are OWASP Top 10 vulnerabilities?",
+    "How to connect Python to PostgreSQL?",
+    "What are key services in AWS Framework?",
+]
+SESSION_STATE_FILE = "session_state.json"
+STAGE_NAME = "@cortex_search_tutorial_db.public.fomc"
+HISTORY_TOKEN_BUDGET = 1500
+SUMMARY_SKIP_TOKENS = 400
+EXACT_CACHE_TTL = 3600
+EXACT_CACHE_MAX_ENTRIES = 512
+RERANK_CANDIDATES = 20
+CONTEXT_TOKEN_BUDGET = 2048
+MAX_CONCURRENT_COMPLETIONS = 8
+LLM_ADMIT_TIMEOUT = 0.5
+
+# Prompt templates are compiled once at import; only the holes vary per call.
+SUMMARIZE_PROMPT_TMPL = string.Template("""
+    [INST]
+    Extend the user question using the chat history.
+    <chat_history>$chat_history</chat_history>
+    <question>$question</question>
+    [/INST]
+    """)
+
+ANSWER_PROMPT_TMPL = string.Template("""
+    [INST]
+    You are SS IntelliBot, a helpful AI assistant with access to PDF-based knowledge.
+    Use the provided <context> and <chat_history> to answer user questions.
+    Respond clearly, briefly, and helpfully.
+
+    <chat_history>$chat_history</chat_history>
+    <context>$context</context>
+    <question>$question</question>
+    [/INST]
+    Answer:
+    """)
+
+CHAT_SUMMARY_PROMPT_TMPL = string.Template("""
+    [INST]
+    You are an expert summarizer. Summarize the following chat conversation into 5-7 key bullet points that capture the main ideas and solutions shared by the assistant. Be concise, and do not repeat.
+    <chat_history>
+    $chat_history
+    </chat_history>
+    Your output should look like:
+    - Point 1
+    - Point 2
+    ...
+    [/INST]
+    """)
+
+def complete(session, model, prompt):
+    from snowflake.cortex import Complete
+    return Complete(model, prompt, session=session).replace("$", "\$")
+
+
+def complete_stream(session, model, prompt):
+    from snowflake.cortex import Complete
+    for chunk in Complete(model, prompt, session=session, stream=True):
+        yield chunk.replace("$", "\$")
+
+
+def save_session_state():
+    with open(SESSION_STATE_FILE, "w") as f:
+        json.dump({
+            "messages": st.session_state.get("messages", []),
+            "pinned_messages": st.session_state.get("pinned_messages", [])
+        }, f)
+
+
+def load_session_state():
+    if os.path.exists(SESSION_STATE_FILE):
+        with open(SESSION_STATE_FILE, "r") as f:
+            state = json.load(f)
+            st.session_state["messages"] = state.get("messages", [])
+            st.session_state["pinned_messages"] = state.get("pinned_messages", [])
+
+
+def init_messages():
+    if "messages" not in st.session_state:
+        load_session_state()
+        st.session_state.setdefault("messages", [])
+        st.session_state.setdefault("pinned_messages", [])
+    if st.session_state.get("clear_conversation"):
+        st.session_state.messages = []
+        save_session_state()
+
+
+@st.cache_resource(ttl=3600)
+def _load_service_metadata(_session):
+    try:
+        rows = _session.sql(
+            "SELECT service_name, search_column FROM INFORMATION_SCHEMA.CORTEX_SEARCH_SERVICES;"
+        ).collect()
+        return [{"name": r["SERVICE_NAME"], "search_column": r["SEARCH_COLUMN"]} for r in rows]
+    except Exception:
+        pass
+    services = _session.sql("SHOW CORTEX SEARCH SERVICES;").collect()
+    metadata = []
+    for s in services:
+        svc_name = s["name"]
+        search_col = _session.sql(f"DESC CORTEX SEARCH SERVICE {svc_name};").collect()[0]["search_column"]
+        metadata.append({"name": svc_name, "search_column": search_col})
+    return metadata
+
+
+def _match_service_for_topic(topic, service_names):
+    tokens = topic.lower().split()
+    for name in service_names:
+        lowered = name.lower()
+        if all(t in lowered for t in tokens):
+            return name
+    return None
+
+
+def init_service_metadata(session):
+    if "service_metadata" not in st.session_state:
+        metadata = _load_service_metadata(session)
+        st.session_state.service_metadata = metadata
+        st.session_state.search_col_by_name = {m["name"]: m["search_column"].lower() for m in metadata}
+        service_names = [m["name"] for m in metadata]
+        st.session_state.topic_to_service = {
+            topic: _match_service_for_topic(topic, service_names)
+            for topic in TOPICS if topic != "All Topics"
+        }
+
+
+@st.cache_resource
+def _get_encoding():
+    import tiktoken
+    return tiktoken.get_encoding("cl100k_base")
+
+
+def _count_tokens(text):
+    return len(_get_encoding().encode(text))
+
+
+def _tail_by_tokens(msgs, budget=HISTORY_TOKEN_BUDGET):
+    enc = _get_encoding()
+    tail, total = [], 0
+    for msg in reversed(msgs):
+        total += len(enc.encode(msg["content"]))
+        if total > budget and tail:
+            break
+        tail.append(msg)
+    return tail[::-1]
+
+
+def get_chat_history():
+    return _tail_by_tokens(st.session_state.messages[-st.session_state.num_chat_messages:-1])
+
+
+def summarize_chat(session, model, chat_history, question):
+    prompt = SUMMARIZE_PROMPT_TMPL.substitute(chat_history=chat_history, question=question)
+    return complete(session, model, prompt)
+
+
+def _retrieval_params():
+    service_name = st.session_state.selected_cortex_search_service
+    search_filter = {}
+    topic = st.session_state.get("selected_topic", "All Topics")
+    if topic != "All Topics":
+        # Route to the topic's own service when one exists; otherwise fall
+        # back to filtering the selected service.
+        routed = st.session_state.topic_to_service.get(topic)
+        if routed:
+            service_name = routed
+        else:
+            search_filter = {"@eq": {"topic": topic}}
+    return service_name, st.session_state.search_col_by_name[service_name], search_filter
+
+
+def build_prompt(session, question):
+    chat_history = get_chat_history() if st.session_state.use_chat_history else []
+    chat_text = "\n".join([msg["content"] for msg in chat_history if msg["role"] == "user"])
+    # Resolve widget-dependent settings here: the executor's worker threads
+    # have no ScriptRunContext, so they must not touch st.session_state.
+    model = st.session_state.model_name
+    num_chunks = st.session_state.num_retrieved_chunks
+    service_name, search_col, search_filter = _retrieval_params()
+    if chat_history and _count_tokens(chat_text) >= SUMMARY_SKIP_TOKENS:
+        # Summarization and retrieval are independent I/O-bound calls, so run
+        # them in parallel and search on the raw question instead of the summary.
+        executor = get_executor()
+        summary_future = executor.submit(summarize_chat, session, model, chat_text, question)
+        context_future = executor.submit(
+            query_cortex, session, question, service_name, search_col, num_chunks, filter=search_filter)
+        question = summary_future.result()
+        context, dropped = context_future.result()
+    else:
+        # Short histories fit the prompt as-is, so skip the summarization call.
+        context, dropped = query_cortex(session, question, service_name, search_col, num_chunks, filter=search_filter)
+    if st.session_state.debug:
+        st.sidebar.text_area("📄 Context Documents", context, height=300)
+        if dropped:
+            st.sidebar.caption(f"✂️ Dropped {dropped} bytes of context over the {CONTEXT_TOKEN_BUDGET}-token budget")
+    return ANSWER_PROMPT_TMPL.substitute(chat_history=chat_text, context=context, question=question)
+
+
+def _rerank_results(session, query, results, search_col, keep):
+    try:
+        row = session.sql(
+            "SELECT SNOWFLAKE.CORTEX.RERANK(?, ?)",
+            [query, json.dumps([r[search_col] for r in results])],
+        ).collect()[0]
+        scores = json.loads(row[0])
+        order = sorted(range(len(results)), key=lambda i: scores[i], reverse=True)
+        return [results[i] for i in order[:keep]]
+    except Exception:
+        # Reranker unavailable; keep the search service's own ordering.
+        return results[:keep]
+
+
+def query_cortex(session, query, service_name, search_col, num_chunks, columns=None, filter={}):
+    columns = columns or []
+    db, schema = session.get_current_database(), session.get_current_schema()
+    svc = get_root().databases[db].schemas[schema].cortex_search_services[service_name]
+    all_columns = list(set(columns + [search_col, "file_url", "relative_path"]))
+    # Retrieve a wide candidate set, then rerank down to the configured count.
+    limit = max(RERANK_CANDIDATES, num_chunks)
+    try:
+        results = svc.search(query, columns=all_columns, filter=filter, limit=limit).results
+    except Exception:
+        if not filter:
+            raise
+        # The service may not define the filtered attribute (e.g. no topic
+        # column on the fomc service); retry unfiltered instead of failing.
+        results = svc.search(query, columns=all_columns, filter={}, limit=limit).results
+    results = _rerank_results(session, query, results, search_col, num_chunks)
+
+    # Admit chunks in score order until the token budget is spent, truncating
+    # the last admitted chunk at the boundary so one long page can't blow up
+    # the prompt.
+    enc = _get_encoding()
+    pieces, total, dropped = [], 0, 0
+    for r in results:
+        file = r.get("relative_path", "unknown")
+        chunk = r.get(search_col, "[Missing chunk]")
+        remaining = CONTEXT_TOKEN_BUDGET - total
+        if remaining <= 0:
+            dropped += len(chunk)
+            continue
+        tokens = enc.encode(chunk)
+        if len(tokens) > remaining:
+            truncated = enc.decode(tokens[:remaining])
+            dropped += len(chunk) - len(truncated)
+            chunk = truncated
+        total += min(len(tokens), remaining)
+        pieces.append(f"Context {len(pieces) + 1}: {file}:\n{chunk}")
+
+    return "\n\n".join(pieces), dropped
+
+
+def apply_theme():
+    if st.session_state.get("dark_mode"):
+        st.markdown("""
+            <style>
+            body, .stApp {
+                background-color: #0e1117;
+                color: #fafafa;
+            }
+            </style>
+        """, unsafe_allow_html=True)
+    else:
+        st.markdown("""
+            <style>
+            body, .stApp {
+                background-color: #f2f2f2;
+                color: #000000;
+            }
+            </style>
+        """, unsafe_allow_html=True)
+
+
+def init_config():
+    with st.sidebar:
+        st.toggle("🌓 Dark Mode", key="dark_mode", value=False)
+        apply_theme()
+        st.title("⚙️ Configuration")
+        st.selectbox("Cortex Search Service", [s["name"] for s in st.session_state.service_metadata], key="selected_cortex_search_service")
+        st.button("🧹 Clear Chat", key="clear_conversation")
+        st.toggle("🐞 Debug Mode", key="debug", value=False)
+        st.toggle("🕘 Use Chat History", key="use_chat_history", value=True)
+        st.selectbox("📂 Filter by Topic", TOPICS, key="selected_topic")
+        st.image("https://raw.githubusercontent.com/Shail1602/Inellibot/main/SS%20Intellibot.png", caption="SS IntelliBot", use_container_width=True)
+        st.caption("Ask Smart. Get Smarter.")
+        
+        with st.expander("🧠 Advanced Options"):
+            st.selectbox("Select Model", MODELS, key="model_name")
+            st.slider("Context Chunks", 1, 10, 5, key="num_retrieved_chunks")
+            st.slider("Chat History Messages", 1, 10, 5, key="num_chat_messages")
+
+def upload_to_snowflake_stage(uploaded_file):
+    import fitz
+    import snowflake.connector
+
+    with tempfile.NamedTemporaryFile(delete=False) as tmp:
+        tmp.write(uploaded_file.read())
+        tmp_path = tmp.name
+
+    conn = snowflake.connector.connect(**_connection_parameters())
+    cs = conn.cursor()
+    file_name = os.path.basename(uploaded_file.name).replace(" ", "_")
+    staged_path = f"{file_name}" 
+    target_temp_path = os.path.join(tempfile.gettempdir(), file_name)
+    shutil.copy(tmp_path, target_temp_path)
+    staged_file_path = f"fomc/{file_name}"
+
+    extracted_text = []
+    try:
+        with fitz.open(tmp_path) as doc:
+            for page in doc:
+                text = page.get_text()
+                if text.strip():
+                    extracted_text.append(text.strip())
+    except Exception as e:
+        st.error(f"Failed to extract text: {e}")
+        return
+    
+    try:
+        put_query = f"PUT file://{target_temp_path} {STAGE_NAME}  OVERWRITE=TRUE AUTO_COMPRESS=FALSE"
+        cs.execute(put_query)
+        cs.execute("USE DATABASE cortex_search_tutorial_db")
+        cs.execute("USE SCHEMA public")
+        cs.execute(f"ALTER STAGE cortex_search_tutorial_db.public.fomc REFRESH")
+        
+        for idx, chunk in enumerate(extracted_text):
+            chunk_sql = f"""
+            INSERT INTO cortex_search_tutorial_db.public.docs_chunks_table
+            SELECT
+                relative_path,
+                build_scoped_file_url({STAGE_NAME}, relative_path) AS file_url,
+                CONCAT(SPLIT_PART(relative_path, '/', -1), ': ', func.chunk) AS chunk,
+                'English' AS language
+            FROM (
+                SELECT relative_path
+                FROM directory({STAGE_NAME})
+                WHERE relative_path = ('{file_name}') 
+            ),
+            TABLE(cortex_search_tutorial_db.public.pdf_text_chunker(build_scoped_file_url({STAGE_NAME}, relative_path))) AS func;
+            """
+            cs.execute(chunk_sql)
+            cs.execute("ALTER STAGE cortex_search_tutorial_db.public.fomc REFRESH")
+            cs.execute("""
+            CREATE OR REPLACE CORTEX SEARCH SERVICE cortex_search_tutorial_db.public.fomc_meeting
+                ON chunk
+                ATTRIBUTES language
+                WAREHOUSE = cortex_search_tutorial_wh
+                TARGET_LAG = '1 minute'
+                AS (
+                    SELECT
+                        chunk,
+                        relative_path,
+                        file_url,
+                        language
+                    FROM cortex_search_tutorial_db.public.docs_chunks_table
+                );
+            """)
+            st.success(f"✅ Uploaded and Reindexed the file : {file_name}")
+            
+            os.remove(tmp_path)
+            if os.path.exists(target_temp_path):
+                os.remove(target_temp_path)       
+            if "uploaded_pdf" in st.session_state:
+                del st.session_state["uploaded_pdf"]
+            
+    except Exception as e:
+        st.error(f"Failed to upload/index: {e}")
+    finally:
+        cs.close()
+        conn.close()
+
+def handle_uploaded_pdf():
+    uploaded_file = st.sidebar.file_uploader("📥 Upload PDF", type=["pdf"], key="pdf_uploader")
+    if uploaded_file is not None:
+        st.session_state.uploaded_pdf = uploaded_file.name
+        st.sidebar.success(f"Uploaded: {uploaded_file.name}")
+        upload_to_snowflake_stage(uploaded_file)
+
+
+@st.cache_data(show_spinner=False, max_entries=4, ttl=3600)
+def _serialize_chat(items):
+    return "\n".join(f"{role.capitalize()}: {content}" for role, content in items)
+
+
+def _warm_cache(session, queries):
+    for q in queries:
+        try:
+            prompt = build_prompt(session, q.replace("'", ""))
+            key = prompt_key(st.session_state.model_name, prompt)
+            if exact_cache_get(key) is None:
+                exact_cache_put(key, complete(session, st.session_state.model_name, prompt))
+        except Exception:
+            # Warm-up is best effort; real requests just miss the cache.
+            break
+
+
+def warm_example_queries(session):
+    if st.session_state.get("warmed") is None:
+        st.session_state.warmed = True
+        from streamlit.runtime.scriptrunner import add_script_run_ctx
+        warm_thread = threading.Thread(target=_warm_cache, args=(session, EXAMPLE_QUERIES), daemon=True)
+        add_script_run_ctx(warm_thread)
+        warm_thread.start()
+
+
+def generate_summary(session):
+    formatted_history = "\n".join(
+        f"{'User' if m['role'] == 'user' else 'Assistant'}: {m['content']}"
+        for m in st.session_state.messages
+    )
+    prompt = CHAT_SUMMARY_PROMPT_TMPL.substitute(chat_history=formatted_history)
+    summary = complete(session, st.session_state.model_name, prompt)
+    return summary.strip()
+
+
+def main():
+    st.markdown("""<div style='background: linear-gradient(to right, #f2f2f2, #e0f7fa); padding: 25px 40px; border-radius: 12px; box-shadow: 0 2px 8px rgba(0,0,0,0.1); margin-bottom: 20px; display: flex; align-items: center; justify-content: center; gap: 20px;'>
+    <div style='display: flex; align-items: center; gap: 20px;'>
+        <div style='background-color: #7b2cbf; color: white; font-size: 50px; font-weight: bold; width: 90px; height: 90px; border-radius: 50%; display: flex; align-items: center; justify-content: center; box-shadow: 0 0 12px rgba(123, 44, 191, 0.7); animation: pulseGlow 2s infinite;'>SS</div>
+        <div style='text-align: left;'>
+            <div style='font-size: 32px; font-weight: bold; color: #1f77b4;'>SS IntelliBot</div>
+            <div style='font-size: 16px; color: #333;'>Precision. Speed. Knowledge. — Your AI companion for data-driven excellence.</div>
+            <div style='font-size: 13px; color: #555; font-style: italic; margin-top: 8px;'>👨‍💻 Crafted with expertise by <strong>Shailesh Rahul</strong> & <strong>Saumya Shruti</strong></div>
+        </div>
+    </div>
+    <div>
+        <img src='https://raw.githubusercontent.com/Shail1602/Inellibot/main/dbr.jpg' alt='DB Logo' style='height: 100px; border-radius: 8px;'>
+        </div>
+        </div>
+    """, unsafe_allow_html=True)
+    st.markdown("<hr>", unsafe_allow_html=True)
+
+    session = get_session()
+    init_service_metadata(session)
+    handle_uploaded_pdf()
+    init_config()
+    init_messages()
+    warm_example_queries(session)
+
+    if len(st.session_state.messages) == 0:
+        st.markdown("""<div class='hero' style='margin-top: 10px;'>
+            👋 Welcome to SS IntelliBot! Ask any question based on our uploaded documents:
+            <br><br>
+            <b>Topics Available:</b> Database Concepts, AWS Framework, Python for Beginners,
+            Azure, PostgreSQL, Kubernetes, Pro Git, and OWASP.
+            <br><br>
+            Type your question below to get started!
+            <br><br>
+            <b>Try asking:</b>
+            <ul style='list-style-type: none; padding: 0;'>
+                <li>🔍 What is the difference between RDS and Redshift?</li>
+                <li>🤖 How do I deploy a model in Kubernetes?</li>
+                <li>🔐 What are OWASP Top 10 vulnerabilities?</li>
+                <li>🐘 How to connect Python to PostgreSQL?</li>
+                <li>☁️ What are key services in AWS Framework?</li>
+            </ul>
+        </div>""", unsafe_allow_html=True)
+
+    for i, msg in enumerate(st.session_state.messages):
+        with st.chat_message(msg["role"]):
+            st.markdown(msg["content"])
+            if msg["role"] == "assistant":
+                if st.button("⭐ Pin this response", key=f"pin_{i}"):
+                    st.session_state.pinned_messages.append(msg["content"])
+                    save_session_state()
+                    st.success("Pinned!")
+
+    disable_chat = not st.session_state.service_metadata
+    if question := st.chat_input("💬 Ask your question...", disabled=disable_chat):
+        st.session_state.messages.append({"role": "user", "content": question})
+        with st.spinner("SS IntelliBot is typing..."):
+            import semantic_cache
+            q_vec = semantic_cache.embed_question(session, semantic_cache.normalize(question))
+            reply = semantic_cache.lookup(q_vec)
+            if reply is None:
+                # Bound concurrent LLM work so bursts get a clean rejection
+                # instead of saturating the Cortex endpoint.
+                llm_sem = get_llm_semaphore()
+                if not llm_sem.acquire(timeout=LLM_ADMIT_TIMEOUT):
+                    st.session_state.messages.pop()
+                    st.warning("⏳ SS IntelliBot is busy right now — please try again in a moment.")
+                    st.stop()
+                try:
+                    prompt = build_prompt(session, question.replace("'", ""))
+                    key = prompt_key(st.session_state.model_name, prompt)
+                    reply = exact_cache_get(key)
+                    if reply is not None:
+                        with st.chat_message("assistant"):
+                            st.markdown(reply)
+                    else:
+                        inflight = get_inflight_requests()
+                        with inflight["lock"]:
+                            pending = inflight["futures"].get(key)
+                            if pending is None:
+                                inflight["futures"][key] = Future()
+                        if pending is not None:
+                            # An identical request is already in flight; share its answer.
+                            reply = pending.result()
+                            with st.chat_message("assistant"):
+                                st.markdown(reply)
+                        else:
+                            try:
+                                with st.chat_message("assistant"):
+                                    reply = st.write_stream(complete_stream(session, st.session_state.model_name, prompt))
+                                inflight["futures"][key].set_result(reply)
+                            except BaseException as e:
+                                inflight["futures"][key].set_exception(e)
+                                raise
+                            finally:
+                                with inflight["lock"]:
+                                    inflight["futures"].pop(key, None)
+                            semantic_cache.store(q_vec, reply)
+                            exact_cache_put(key, reply)
+                finally:
+                    llm_sem.release()
+            else:
+                with st.chat_message("assistant"):
+                    st.markdown(reply)
+            st.session_state.messages.append({"role": "assistant", "content": reply})
+            save_session_state()
+
+    if st.session_state.messages:
+        with st.expander("📌 Pinned Messages"):
+            for i, msg in enumerate(st.session_state.pinned_messages):
+                st.markdown(f"**Pinned {i+1}:** {msg}")
+
+        with st.expander("📊 Generate Summary"):
+            if st.button("Generate Insight Summary"):
+                summary = generate_summary(session)
+                st.markdown(f"**🔎 Summary:**\n\n{summary}", unsafe_allow_html=True)
+
+        with st.expander("⬇️ Download Chat History"):
+            full_chat = _serialize_chat(tuple((m["role"], m["content"]) for m in st.session_state.messages))
+            st.download_button("Download .txt", full_chat, file_name="chat_history.txt")
+
+        with st.expander("📢 Feedback"):
+            st.radio("How helpful was the response?", ["👍 Excellent", "👌 Good", "👎 Needs Improvement"])
+
+if __name__ == "__main__":
+    main()